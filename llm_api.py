@@ -1,199 +1,525 @@
+import asyncio
 import csv
-import json
-from groq import Groq
+import hashlib
+import logging
+import logging.handlers
+import queue
+import string
+import sys
+import unicodedata
+import httpx
+import orjson
+from aiolimiter import AsyncLimiter
+from groq import APIConnectionError, APIError, AsyncGroq, InternalServerError, RateLimitError
+from rapidfuzz import fuzz
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
 import os
 from dotenv import load_dotenv
-# Initialize Groq client
+# Load the Groq API key
 load_dotenv()
 groq_key = os.getenv("GROQ_API_KEY")
 if not groq_key:
     raise EnvironmentError("❌ GROQ_API_KEY is not set. Please check your .env file or environment.")
 
-client = Groq(api_key=groq_key)
+# Maximum number of in-flight Groq requests
+MAX_CONCURRENCY = 16
+
+# Connection pool shared by all requests in a run; HTTP/2 amortizes handshakes
+# and multiplexes concurrent requests over the same connections
+HTTP_LIMITS = httpx.Limits(max_connections=128, max_keepalive_connections=128)
+
+# Attempts per request before a 429/5xx/connection error is raised
+MAX_ATTEMPTS = 5
+
+logger = logging.getLogger(__name__)
+
+# Verdicts from previous runs, keyed by a hash of the prompt, models and test case
+CACHE_FILE = "cache.jsonl"
+
 # Final Optimized AML Matching Prompt
-PROMPT = """ You are an AI compliance analyst specializing in ultra-precise Anti-Money Laundering (AML) screening for global financial institutions. Your role is to determine whether a transaction record accurately matches a high-risk watchlist entity with forensic precision, minimizing both false positives (blocking legitimate activity) and false negatives (allowing risky activity).
-
-🔍 Decision Framework:
-- ✅ True Match → Block & Review  
-  (Only when there is conclusive legal, identity, or ownership alignment)
-
-- ❌ False Match → Allow & Log  
-  (Default decision in the presence of ambiguity, weak match, or contextual mismatch)
-
-⚙️ Matching Protocol (Execute Sequentially)
-
-1. TYPE VALIDATION
-Return False Match if:
-- The entity types do not align (e.g., person compared to legal entity)
-- Either record lacks valid, interpretable type designation
-- The transaction targets only a product, service, or non-legal reference
-
-2. NAME NORMALIZATION
-
-a) Text Standardization
-- Convert text to lowercase
-- Remove non-essential punctuation and special characters
-- Normalize connectors (e.g., & → and, standardize spacing/hyphens)
-
-b) Lexical Normalization
-- Standardize suffixes for legal entities (e.g., inc, llc, ltd)
-- Remove generic descriptors unless legally significant (e.g., "the", "company")
-
-c) Cultural Name Normalization
-- Arabic names: Normalize transliteration variants; standardize structures such as ibn, bin, ben; reorder components if needed  
-- East Asian names: Reorder family/given names as required  
-- Slavic/Cyrillic and others: Apply consistent transliteration and resolve patronymics/matronymics  
-- Mononyms: Mark as incomplete unless verified by secondary identifiers
-
-3. PRECISION MATCHING CRITERIA
-
-► PERSON MATCHES (Strict Mode)
-- Required:
-  - At least two meaningful name components must align
-  - Normalized name similarity ≥ 85%
-- Patronymic logic:
-  - Treat nested structures (e.g., ibn <X>) as valid if <X> aligns with components in the other name
-  - Accept reordered name structures if overall similarity and components align
-- Reject match if:
-  - Only one component matches
-  - Conflicting identity fields (DOB, ID, nationality) are present
-
-► ENTITY MATCHES (Enhanced Legal Mode)
-- Match only if:
-  - Legal name similarity ≥ 95%, or
-  - Core brand name matches and:
-    - The only variation is a geographic suffix
-    - Legal suffixes are normalized and non-conflicting
-    - Verified legal or hierarchical relationship exists
-- Reject match if:
-  - The transaction refers to a brand, product, or service with no legal tie
-  - Functional descriptors differ without legal documentation
-
-4. GLOBAL BRAND EXCEPTION HANDLING
-
-a) Financial Institutions:
-- Consider a valid match if:
-  - A known financial institution’s core brand aligns
-  - Legal suffix variation is present but does not alter identity
-  - No business function shift is introduced
-
-b) Commercial Entities:
-- Allow match if:
-  - Core brand is identical
-  - Geographic suffix is the only difference
-  - No conflicting legal designation or structural shift is introduced
-
-5. STRICT EXCLUSION RULES
-- Do not match based on a single personal name component
-- Do not treat products or brand mentions as legal entities
-- Do not perform fuzzy matching unless protocol-defined thresholds are satisfied
-- Reject incomplete personal identifiers (e.g., mononyms) unless supporting identifiers exist
-
-📤 Output Format (Strict JSON)
-{
-  "MatchOutcome": "True Match | False Match",
-  "Confidence": "High | Medium | Low",
-  "Reason": {
-    "TypeValidation": "<Pass | Fail>",
-    "NormalizationSteps": "<Detailed explanation of text, legal, and cultural normalization applied>",
-    "AppliedCriteria": "<Summary of rule(s) used to justify match decision>",
-    "AnomaliesNoted": "<Optional: edge cases, cultural variations, or missing info>"
-  },
-  "RecommendedAction": "Block & Review | Allow & Log"
+PROMPT = """You are an AML screening analyst. Decide if each transaction record matches a high-risk watchlist entry, minimizing false positives and false negatives.
+
+Outcomes:
+- True Match -> Block & Review. Only on conclusive legal, identity, or ownership alignment.
+- False Match -> Allow & Log. Default for ambiguity, weak match, or contextual mismatch.
+
+Apply these steps in order:
+
+1. Type validation. False Match if the entity types differ (person vs legal entity), either record lacks an interpretable type, or the transaction names only a product, service, or non-legal reference.
+
+2. Normalization.
+a. Lowercase; drop non-essential punctuation and special characters; & -> and; standardize spacing and hyphens.
+b. Standardize legal suffixes (inc, llc, ltd); drop generic descriptors (the, company) unless legally significant.
+c. Arabic: unify transliterations and ibn/bin/ben, reorder if needed. East Asian: reorder family/given names. Slavic/Cyrillic and others: consistent transliteration, resolve patronymics/matronymics. Mononyms are incomplete unless secondary identifiers verify them.
+
+3. Person match (strict): needs at least two aligned name components and normalized similarity >= 85%. Nested patronymics (ibn X) count if X aligns with the other name; reordered names count if components and similarity align. Reject if only one component matches or DOB, ID, or nationality conflict.
+
+4. Entity match: needs legal name similarity >= 95%, or an identical core brand where the only difference is a geographic suffix, legal suffixes are normalized and non-conflicting, and a verified legal or hierarchical relationship exists. Reject brand/product/service references with no legal tie, and differing functional descriptors without legal documentation.
+
+5. Brand exceptions. Financial institutions: match if a known financial institution's core brand aligns and any legal suffix variation changes neither identity nor business function. Commercial entities: match if the core brand is identical, only the geographic suffix differs, and no legal designation or structure conflicts.
+
+6. Exclusions: never match on a single personal name component; never treat products or brand mentions as legal entities; no fuzzy matching below the thresholds above; reject mononyms without supporting identifiers.
+
+Input: a numbered list of cases. Evaluate each independently.
+
+Output: strict JSON with one result per case, in input order:
+{"results": [{"Case": <case number>, "MatchOutcome": "True Match | False Match", "Confidence": "High | Medium | Low", "Reason": {"TypeValidation": "Pass | Fail", "NormalizationSteps": "<text, legal, and cultural normalization applied>", "AppliedCriteria": "<rules that decided the outcome>", "AnomaliesNoted": "<edge cases or missing info; may be empty>"}, "RecommendedAction": "Block & Review | Allow & Log"}]}"""
+
+# The system message is the shared prefix of every request. Build it once so
+# each call sends byte-identical content and hits the provider's prefix cache;
+# anything that varies per case belongs in the user message only.
+SYSTEM_MSG = {"role": "system", "content": PROMPT}
+PROMPT_BYTES = PROMPT.encode("utf-8")
+
+# Shared by every request so it is not rebuilt per call
+RESPONSE_FORMAT = {"type": "json_object"}
+
+CASE_TEMPLATE = (
+    "Case {number}:\n"
+    "Transaction Data: {transaction_data}\n"
+    "High Risk Database Entry: {watchlist_entry}\n"
+    "High Risk Database Entry Type: {watchlist_type}\n"
+)
+
+BATCH_INSTRUCTION = (
+    "Analyze each potential match according to the protocol and return ONLY the JSON output, "
+    "with exactly one result per case."
+)
+
+# Number of test cases packed into one request to amortize the prompt prefill
+BATCH_SIZE = 8
+
+# Every case goes to the small draft model first; only verdicts it is not
+# highly confident about are re-issued to the larger verify model
+DRAFT_MODEL = "llama-3.1-8b-instant"
+VERIFY_MODEL = "llama3-70b-8192"
+
+# Requests per minute allowed for each model, kept under Groq's per-model quotas
+rate_limiters = {
+    DRAFT_MODEL: AsyncLimiter(max_rate=30, time_period=60),
+    VERIFY_MODEL: AsyncLimiter(max_rate=30, time_period=60)
 }
 
+# Running totals used to verify prefix cache hits
+token_usage = {"prompt_tokens": 0, "cached_tokens": 0}
 
-"""
-def process_test_case(transaction_data, watchlist_entry, watchlist_type):
-    """Send a test case to Groq API and return the response"""
-    user_message = f"""
-    Transaction Data: {transaction_data}
-    High Risk Database Entry: {watchlist_entry}
-    High Risk Database Entry Type: {watchlist_type}
-    
-    Analyze this potential match according to the protocol and return ONLY the JSON output.
-    """
-    
-    response = client.chat.completions.create(
-        messages=[
-            {"role": "system", "content": PROMPT},
-            {"role": "user", "content": user_message}
-        ],
-        model="llama3-70b-8192",
-        temperature=0.1,
-        response_format={"type": "json_object"}
-    )
-    
+def record_usage(usage):
+    """Add a response's prompt token counts to the running totals"""
+    if usage is None:
+        return
+    token_usage["prompt_tokens"] += usage.prompt_tokens or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    token_usage["cached_tokens"] += getattr(details, "cached_tokens", None) or 0
+
+def build_user_message(cases):
+    """Format a batch of (transaction, watchlist entry, entry type) cases as one user message"""
+    parts = [
+        CASE_TEMPLATE.format(
+            number=number,
+            transaction_data=transaction_data,
+            watchlist_entry=watchlist_entry,
+            watchlist_type=watchlist_type
+        )
+        for number, (transaction_data, watchlist_entry, watchlist_type) in enumerate(cases, start=1)
+    ]
+    parts.append(BATCH_INSTRUCTION)
+    return "\n".join(parts)
+
+_backoff = wait_exponential_jitter()
+
+def wait_for_retry(retry_state):
+    """Wait as long as a 429's Retry-After header asks, otherwise back off exponentially"""
+    error = retry_state.outcome.exception()
+    if isinstance(error, RateLimitError):
+        try:
+            return float(error.response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    return _backoff(retry_state)
+
+async def create_completion(client, model, **kwargs):
+    """Create a chat completion within the model's rate limit, retrying transient failures"""
+    async for attempt in AsyncRetrying(
+        retry=retry_if_exception_type((RateLimitError, InternalServerError, APIConnectionError)),
+        wait=wait_for_retry,
+        stop=stop_after_attempt(MAX_ATTEMPTS),
+        reraise=True
+    ):
+        with attempt:
+            async with rate_limiters[model]:
+                return await client.chat.completions.create(model=model, **kwargs)
+
+async def request_json(client, user_message, model):
+    """Send a user message to a Groq model and return the parsed JSON response"""
+    # Any API failure is logged and treated like an unusable response, so the
+    # per-case fallback and "Skipping case" handling take over instead of one
+    # failed request aborting the whole run
     try:
-        return json.loads(response.choices[0].message.content)
-    except json.JSONDecodeError:
-        print("Failed to parse JSON response")
+        response = await create_completion(
+            client,
+            model,
+            messages=[
+                SYSTEM_MSG,
+                {"role": "user", "content": user_message}
+            ],
+            temperature=0.1,
+            response_format=RESPONSE_FORMAT
+        )
+    except (APIError, httpx.HTTPError) as e:
+        logger.warning(f"Request to {model} failed: {e}")
         return None
+    record_usage(response.usage)
+
+    try:
+        return orjson.loads(response.choices[0].message.content)
+    except orjson.JSONDecodeError:
+        logger.warning("Failed to parse JSON response")
+        return None
+
+async def process_batch(client, cases, model):
+    """Send a batch of test cases to a Groq model and return one response per case"""
+    response = await request_json(client, build_user_message(cases), model)
+    results = response.get("results") if isinstance(response, dict) else None
+
+    if not isinstance(results, list) or len(results) != len(cases):
+        logger.warning(f"Expected {len(cases)} results in batched response")
+        return None
+    if not all(isinstance(result, dict) for result in results):
+        logger.warning("Malformed result in batched response")
+        return None
+    # Verdicts are attached to cases by position, so with more than one case the
+    # numbering must match exactly (a number sent as a string is accepted)
+    if len(cases) > 1 and any(
+        str(result.get("Case")).strip() != str(i) for i, result in enumerate(results, start=1)
+    ):
+        logger.warning("Case numbers in batched response do not match the request")
+        return None
+    return results
+
+# Fields every verdict must carry to be scored
+REQUIRED_FIELDS = ('MatchOutcome', 'Confidence', 'Reason', 'RecommendedAction')
+
+def is_complete(result):
+    """Return True if a verdict carries every required output field"""
+    return isinstance(result, dict) and all(field in result for field in REQUIRED_FIELDS)
+
+def is_confident(result):
+    """Return True if a draft verdict is complete and reported with high confidence"""
+    return is_complete(result) and str(result['Confidence']).strip().upper() == "HIGH"
+
+# Suffixes and descriptors that only appear in legal entity names
+LEGAL_ENTITY_TOKENS = frozenset({
+    "inc", "incorporated", "llc", "llp", "ltd", "limited", "corp", "corporation",
+    "plc", "gmbh", "company", "bank", "holdings"
+})
+PERSON_TYPES = frozenset({"person", "individual"})
+ENTITY_TYPES = frozenset({
+    "entity", "legal entity", "organization", "organisation", "company", "corporation", "business"
+})
+
+# Local similarity scores far enough from the protocol's 85%/95% thresholds
+# that the model's decision is already determined
+FUZZY_REJECT_BELOW = 60
+FUZZY_ACCEPT_ABOVE = 98
+
+_PUNCTUATION_TO_SPACE = str.maketrans({char: " " for char in string.punctuation})
+
+def normalize_name(text):
+    """Fold accents, lowercase, and strip punctuation so names compare by their tokens"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = text.lower().replace("&", " and ").translate(_PUNCTUATION_TO_SPACE)
+    return " ".join(text.split())
+
+def best_component_similarity(tx_tokens, wl_tokens):
+    """Return the highest similarity between any transaction token and any watchlist token"""
+    return max(
+        (fuzz.ratio(tx_token, wl_token) for tx_token in tx_tokens for wl_token in wl_tokens),
+        default=0
+    )
+
+def local_verdict(is_match, type_validation, criteria):
+    """Build a response in the model's output format for a case decided locally"""
+    return {
+        "MatchOutcome": "True Match" if is_match else "False Match",
+        "Confidence": "High",
+        "Reason": {
+            "TypeValidation": type_validation,
+            "NormalizationSteps": "Local pre-filter: NFKD accent folding, lowercasing, punctuation removal",
+            "AppliedCriteria": criteria,
+            "AnomaliesNoted": ""
+        },
+        "RecommendedAction": "Block & Review" if is_match else "Allow & Log"
+    }
+
+def prefilter(transaction_data, watchlist_entry, watchlist_type):
+    """Decide cases the protocol settles without the model; return None for everything else"""
+    norm_tx = normalize_name(transaction_data)
+    norm_wl = normalize_name(watchlist_entry)
+    norm_type = normalize_name(watchlist_type)
+    tx_tokens = norm_tx.split()
+
+    # Protocol step 1: a person entry can never match a legal entity
+    if norm_type in PERSON_TYPES and LEGAL_ENTITY_TOKENS.intersection(tx_tokens):
+        return local_verdict(False, "Fail", "Transaction names a legal entity but the watchlist entry is a person")
+
+    # Step 1 also rejects records without an interpretable type, which is the
+    # model's call to make, so only a recognised type can be matched locally
+    type_recognised = norm_type in PERSON_TYPES or norm_type in ENTITY_TYPES
+
+    # Identical names with at least two components satisfy every similarity threshold
+    if type_recognised and norm_tx == norm_wl and len(tx_tokens) >= 2:
+        return local_verdict(True, "Pass", "Normalized names are identical")
+
+    # Character similarity is meaningless across scripts (e.g. Cyrillic vs Latin),
+    # so leave any name that is not ASCII after folding to the model's
+    # transliteration step
+    if not (norm_tx.isascii() and norm_wl.isascii()):
+        return None
+
+    # Reject only when no component of one name is close to any component of the
+    # other. Whole-name scores punish transliteration variants (e.g. Gaddafi and
+    # Qadhafi) that step 2c asks the model to reconcile.
+    if best_component_similarity(tx_tokens, norm_wl.split()) < FUZZY_REJECT_BELOW:
+        return local_verdict(False, "Not evaluated", f"No name component is {FUZZY_REJECT_BELOW}% similar")
+
+    # token_sort_ratio penalizes extra components, so a single shared name cannot
+    # pass; like the identical-name match it needs a recognised entry type
+    if (
+        type_recognised
+        and len(tx_tokens) >= 2
+        and fuzz.token_sort_ratio(norm_tx, norm_wl) > FUZZY_ACCEPT_ABOVE
+    ):
+        return local_verdict(True, "Pass", f"Name similarity above {FUZZY_ACCEPT_ABOVE}%")
+
+    return None
+
+# Changing the prompt invalidates every cached verdict
+PROMPT_DIGEST = hashlib.sha256(PROMPT_BYTES).hexdigest()
+
+def cache_key(transaction_data, watchlist_entry, watchlist_type):
+    """Return a stable key identifying a test case under the current prompt and models"""
+    material = "\x1f".join((
+        PROMPT_DIGEST, DRAFT_MODEL, VERIFY_MODEL, transaction_data, watchlist_entry, watchlist_type
+    ))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def load_cache(cache_file):
+    """Load cached verdicts from a JSONL file, if one exists"""
+    cache = {}
+    if not os.path.exists(cache_file):
+        return cache
+    with open(cache_file, mode='rb') as cache_in:
+        for line in cache_in:
+            try:
+                entry = orjson.loads(line)
+                key, result = entry["key"], entry["result"]
+            except (orjson.JSONDecodeError, KeyError, TypeError):
+                continue
+            # Ignore incomplete verdicts written by earlier versions
+            if is_complete(result):
+                cache[key] = result
+    return cache
+
+def save_cache(cache_file, entries):
+    """Append new cached verdicts to a JSONL file"""
+    if not entries:
+        return
+    with open(cache_file, mode='ab') as cache_out:
+        cache_out.writelines(
+            orjson.dumps({"key": key, "result": result}) + b"\n"
+            for key, result in entries.items()
+        )
+
+async def run_test_cases(cases):
+    """Send (transaction, watchlist entry, entry type) cases to Groq concurrently, preserving order"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    cache = load_cache(CACHE_FILE)
+
+    keys = [cache_key(*case) for case in cases]
+    local = [prefilter(*case) for case in cases]
+
+    # Only send each distinct uncached case the pre-filter could not decide once
+    pending = {}
+    for key, case, verdict in zip(keys, cases, local):
+        if verdict is None and key not in cache and key not in pending:
+            pending[key] = case
+
+    promoted = 0
+
+    async def bounded(cases, model):
+        async with semaphore:
+            return await process_batch(client, cases, model)
+
+    async def classify(cases, model):
+        results = await bounded(cases, model)
+        if results is None and len(cases) > 1:
+            # Fall back to one request per case when the batched response is unusable
+            singles = await asyncio.gather(*[bounded([case], model) for case in cases])
+            results = [single[0] if single else None for single in singles]
+        return results or [None] * len(cases)
+
+    async def send(cases):
+        """Return each case's verdict and whether it is final enough to cache"""
+        nonlocal promoted
+        results = await classify(cases, DRAFT_MODEL)
+        final = [True] * len(cases)
+        uncertain = [i for i, result in enumerate(results) if not is_confident(result)]
+        if uncertain:
+            promoted += len(uncertain)
+            verified = await classify([cases[i] for i in uncertain], VERIFY_MODEL)
+            for i, result in zip(uncertain, verified):
+                if result is not None:
+                    results[i] = result
+                else:
+                    # Keep the unverified draft for this run but never cache it,
+                    # so the case is escalated again next run
+                    final[i] = False
+        return list(zip(results, final))
+
+    pending_cases = list(pending.values())
+    batches = [pending_cases[i:i + BATCH_SIZE] for i in range(0, len(pending_cases), BATCH_SIZE)]
+
+    # Open the pool inside the run so its connections belong to this event loop
+    # and are closed before asyncio.run tears the loop down
+    async with httpx.AsyncClient(http2=True, limits=HTTP_LIMITS) as http_client:
+        # Retries are handled by create_completion so they respect the rate limiter
+        client = AsyncGroq(api_key=groq_key, http_client=http_client, max_retries=0)
+        batch_results = await asyncio.gather(*[send(batch) for batch in batches])
+    outcomes = [outcome for batch in batch_results for outcome in batch]
+
+    # This run's verdicts are returned as-is so incomplete ones still reach
+    # scoring; only complete, verified ones are cached, so the rest are asked
+    # again next run
+    answers = dict(cache)
+    answers.update((key, result) for key, (result, _) in zip(pending, outcomes))
+    fresh = {
+        key: result
+        for key, (result, final) in zip(pending, outcomes)
+        if final and is_complete(result)
+    }
+    save_cache(CACHE_FILE, fresh)
+
+    decided = sum(verdict is not None for verdict in local)
+    logger.info(f"Pre-filtered: {decided}/{len(cases)}, cache hits: {len(cases) - decided - len(pending)}/{len(cases)}")
+    logger.info(f"Promoted to {VERIFY_MODEL}: {promoted}/{len(pending)}")
+    return [verdict or answers.get(key) for verdict, key in zip(local, keys)]
+
+def start_logging():
+    """Route log records through a queue so console writes happen on a background thread"""
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    listener.start()
+    return listener, queue_handler
 
 def evaluate_results(csv_file):
     """Evaluate prompt performance against test cases"""
+    listener, queue_handler = start_logging()
+    try:
+        _evaluate_results(csv_file)
+    finally:
+        listener.stop()
+        logger.removeHandler(queue_handler)
+
+def _evaluate_results(csv_file):
     correct = 0
     total = 0
     mismatches = []
 
     mismatch_file = "mismatches.jsonl"
 
-    with open(csv_file, mode='r') as file, open(mismatch_file, mode='w') as mismatch_out:
-        csv_reader = csv.DictReader(file)
+    with open(csv_file, mode='r') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        rows = [row for row in reader if row]
 
-        for row in csv_reader:
-            expected = row['Match Type'].strip().upper() == 'TRUE'
+    # Resolve column positions once instead of building a dict per row
+    column = {name: i for i, name in enumerate(header)}
+    sid_i = column['SI. No']
+    tx_i = column['Transaction Data']
+    wl_i = column['High Risk Database Entry']
+    wlt_i = column['High Risk Database Entry Type']
+    mt_i = column['Match Type']
 
-            result = process_test_case(
-                row['Transaction Data'],
-                row['High Risk Database Entry'],
-                row['High Risk Database Entry Type']
-            )
+    cases = [(row[tx_i], row[wl_i], row[wlt_i]) for row in rows]
 
-            if not result:
-                print(f"Skipping case {row['SI. No']} due to processing error")
-                continue
+    # Normalize the expected labels in a single pass over the ingested rows
+    expected_labels = [row[mt_i].strip().upper() == 'TRUE' for row in rows]
 
-            # Ensure all required fields exist in the response
-            required_fields = ['MatchOutcome', 'Confidence', 'Reason', 'RecommendedAction']
-            if not all(field in result for field in required_fields):
-                print(f"Missing fields in response for case {row['SI. No']}")
-                continue
+    # API calls are I/O bound, so issue them concurrently and score afterwards.
+    # Scoring and mismatch serialization only start once the event loop has
+    # finished, so they never delay an in-flight request.
+    results = asyncio.run(run_test_cases(cases))
+
+    for row, (tx, wl, wlt), expected, result in zip(rows, cases, expected_labels, results):
+        sid = row[sid_i]
+
+        if not result:
+            logger.warning(f"Skipping case {sid} due to processing error")
+            continue
+
+        # Ensure all required fields exist in the response
+        try:
+            outcome = result['MatchOutcome']
+            confidence = result['Confidence']
+            reason = result['Reason']
+            action = result['RecommendedAction']
+        except KeyError as e:
+            logger.warning(f"Missing field {e} in response for case {sid}")
+            continue
+
+        expected_label = "True Match" if expected else "False Match"
+
+        # str() guards against a non-string outcome from a malformed response
+        predicted = str(outcome).strip().upper() == 'TRUE MATCH'
+        is_correct = predicted == expected
+        status = "✓ CORRECT" if is_correct else "✗ INCORRECT"
+        total += 1
+
+        if is_correct:
+            correct += 1
+        else:
+            # Save mismatch
+            mismatch_entry = {
+                "SI. No": sid,
+                "Transaction Data": tx,
+                "High Risk Database Entry": wl,
+                "High Risk Database Entry Type": wlt,
+                "Expected": expected_label,
+                "Predicted": outcome,
+                "Confidence": confidence,
+                "Reason": reason,
+                "RecommendedAction": action
+            }
+            mismatches.append(orjson.dumps(mismatch_entry) + b"\n")
+
+        # Print comparison as a single record per case
+        logger.info("\n".join((
+            f"Case {sid}: {status}",
+            f"Transaction: {tx}",
+            f"Watchlist: {wl} ({wlt})",
+            f"Expected: {expected_label}",
+            f"Predicted: {outcome} (Confidence: {confidence})",
+            f"Reason: {reason}",
+            "-" * 80
+        )))
 
-            predicted = result['MatchOutcome'].strip().upper() == 'TRUE MATCH'
-            status = "✓ CORRECT" if predicted == expected else "✗ INCORRECT"
-            total += 1
-            
-            if predicted == expected:
-                correct += 1
-            else:
-                # Save mismatch
-                mismatch_entry = {
-                    "SI. No": row['SI. No'],
-                    "Transaction Data": row['Transaction Data'],
-                    "High Risk Database Entry": row['High Risk Database Entry'],
-                    "High Risk Database Entry Type": row['High Risk Database Entry Type'],
-                    "Expected": "True Match" if expected else "False Match",
-                    "Predicted": result['MatchOutcome'],
-                    "Confidence": result['Confidence'],
-                    "Reason": result['Reason'],
-                    "RecommendedAction": result['RecommendedAction']
-                }
-                mismatch_out.write(json.dumps(mismatch_entry) + "\n")
-
-            # Print comparison
-            print(f"Case {row['SI. No']}: {status}")
-            print(f"Transaction: {row['Transaction Data']}")
-            print(f"Watchlist: {row['High Risk Database Entry']} ({row['High Risk Database Entry Type']})")
-            print(f"Expected: {'True Match' if expected else 'False Match'}")
-            print(f"Predicted: {result['MatchOutcome']} (Confidence: {result['Confidence']})")
-            print(f"Reason: {result['Reason']}")
-            print("-" * 80)
+    with open(mismatch_file, mode='wb', buffering=1 << 16) as mismatch_out:
+        mismatch_out.writelines(mismatches)
 
     # Final accuracy
     accuracy = (correct / total) * 100 if total > 0 else 0
-    print(f"\nFinal Accuracy: {accuracy:.2f}% ({correct}/{total} correct)")
-    print(f"Mismatched cases saved to: {mismatch_file}")
+    logger.info("\n".join((
+        f"\nFinal Accuracy: {accuracy:.2f}% ({correct}/{total} correct)",
+        f"Mismatched cases saved to: {mismatch_file}",
+        f"Prompt tokens: {token_usage['prompt_tokens']} (cached: {token_usage['cached_tokens']})"
+    )))
 
 if __name__ == "__main__":
     evaluate_results("Prompt engineering assignment - Sheet1.csv")
\ No newline at end of file
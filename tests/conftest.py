@@ -0,0 +1,6 @@
+import os
+import sys
+
+# llm_api refuses to import without an API key; tests never reach the network
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
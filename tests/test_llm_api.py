@@ -0,0 +1,340 @@
+import asyncio
+import csv
+import json
+import os
+from types import SimpleNamespace
+
+import groq
+import httpx
+import pytest
+from aiolimiter import AsyncLimiter
+
+import llm_api
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+with open(os.path.join(TESTS_DIR, "prompt_before_compaction.txt"), encoding="utf-8") as prompt_file:
+    PROMPT_BEFORE_COMPACTION = prompt_file.read()
+
+
+def load_gold_cases():
+    """Return the gold set as (transaction, entry, entry type) cases and expected match flags"""
+    with open(os.path.join(TESTS_DIR, "gold_cases.csv"), newline="", encoding="utf-8") as gold_file:
+        rows = list(csv.DictReader(gold_file))
+    cases = [
+        (row["Transaction Data"], row["High Risk Database Entry"], row["High Risk Database Entry Type"])
+        for row in rows
+    ]
+    expected = [row["Match Type"].strip().upper() == "TRUE" for row in rows]
+    return cases, expected
+
+
+def is_true_match(result):
+    return str(result["MatchOutcome"]).strip().upper() == "TRUE MATCH"
+
+
+@pytest.mark.parametrize("transaction, watchlist", [
+    ("Muammar Gaddafi", "Moammar Qadhafi"),
+    ("Mohammed bin Salman", "Muhammad ibn Salman"),
+    ("Osama bin Laden", "Usama bin Ladin"),
+    ("Vladimir Putin", "Wladimir Poutine"),
+])
+def test_prefilter_leaves_transliteration_variants_to_the_model(transaction, watchlist):
+    assert llm_api.prefilter(transaction, watchlist, "Person") is None
+
+
+def test_prefilter_rejects_names_with_no_close_component():
+    result = llm_api.prefilter("Tom Brown", "Alice Green", "Person")
+    assert result["MatchOutcome"] == "False Match"
+    assert result["RecommendedAction"] == "Allow & Log"
+    assert result["Reason"]["TypeValidation"] == "Not evaluated"
+
+
+def test_prefilter_fuzzy_accept_requires_recognised_type():
+    # One character apart on a long name: above the accept threshold
+    transaction = "International Business Machines Corporation"
+    watchlist = "International Business Machine Corporation"
+    assert llm_api.prefilter(transaction, watchlist, "Entity")["MatchOutcome"] == "True Match"
+    assert llm_api.prefilter(transaction, watchlist, "") is None
+    assert llm_api.prefilter(transaction, watchlist, "Vessel") is None
+
+
+@pytest.mark.parametrize("rule", [
+    "85%", "95%", "two aligned name components", "only one component",
+    "special characters", "legal suffixes", "ibn/bin/ben", "East Asian", "patronymics",
+    "Mononyms", "DOB, ID, or nationality", "geographic suffix",
+    "known financial institution", "product", "no fuzzy matching",
+])
+def test_compacted_prompt_keeps_protocol_rule(rule):
+    assert rule in llm_api.PROMPT
+
+
+@pytest.mark.parametrize("field", ["results", "Case", *llm_api.REQUIRED_FIELDS, "TypeValidation"])
+def test_compacted_prompt_names_every_output_field(field):
+    assert f'"{field}"' in llm_api.PROMPT
+
+
+def test_compacted_prompt_uses_at_least_30_percent_fewer_tokens():
+    # Optional: Mistral's Tekken tokenizer ships inside the mistral-common wheel,
+    # so a real 131k-vocabulary tiktoken-style BPE can be used offline
+    mistral_common = pytest.importorskip("mistral_common")
+    from mistral_common.tokens.tokenizers.tekken import Tekkenizer
+
+    vocab = os.path.join(os.path.dirname(mistral_common.__file__), "data", "tekken_240911.json")
+    if not os.path.exists(vocab):
+        pytest.skip("bundled Tekken vocabulary not found")
+    tokenizer = Tekkenizer.from_file(vocab)
+
+    before = len(tokenizer.encode(PROMPT_BEFORE_COMPACTION, bos=False, eos=False))
+    after = len(tokenizer.encode(llm_api.PROMPT, bos=False, eos=False))
+    assert after <= 0.7 * before
+
+
+def test_prefilter_agrees_with_gold_set_whenever_it_decides():
+    cases, expected = load_gold_cases()
+    for case, is_match in zip(cases, expected):
+        verdict = llm_api.prefilter(*case)
+        if verdict is not None:
+            assert is_true_match(verdict) == is_match, case
+
+
+@pytest.mark.skipif(
+    not os.environ.get("GROQ_LIVE_TESTS"),
+    reason="set GROQ_LIVE_TESTS=1 and a real GROQ_API_KEY to query the API"
+)
+def test_compacted_prompt_is_at_least_as_accurate_on_gold_set(monkeypatch):
+    cases, expected = load_gold_cases()
+
+    def accuracy(prompt):
+        monkeypatch.setattr(llm_api, "SYSTEM_MSG", {"role": "system", "content": prompt})
+
+        async def run():
+            async with httpx.AsyncClient() as http_client:
+                client = llm_api.AsyncGroq(api_key=os.environ["GROQ_API_KEY"], http_client=http_client)
+                return await llm_api.process_batch(client, cases, llm_api.VERIFY_MODEL)
+
+        results = asyncio.run(run())
+        assert results is not None
+        return sum(is_true_match(result) == is_match for result, is_match in zip(results, expected))
+
+    assert accuracy(llm_api.PROMPT) >= accuracy(PROMPT_BEFORE_COMPACTION)
+
+
+def test_normalize_name_folds_accents_case_and_punctuation():
+    assert llm_api.normalize_name("  José Álvarez-Gómez ") == "jose alvarez gomez"
+    assert llm_api.normalize_name("Smith & Sons, Ltd.") == "smith and sons ltd"
+
+
+def test_prefilter_rejects_legal_entity_against_person_entry():
+    result = llm_api.prefilter("Acme Holdings Ltd.", "John Smith", "Person")
+    assert result["MatchOutcome"] == "False Match"
+    assert result["Reason"]["TypeValidation"] == "Fail"
+
+
+def test_prefilter_matches_identical_names_with_recognised_type():
+    result = llm_api.prefilter("José Álvarez-Gómez", "jose alvarez gomez", "Individual")
+    assert result["MatchOutcome"] == "True Match"
+    assert result["RecommendedAction"] == "Block & Review"
+
+
+@pytest.mark.parametrize("transaction, watchlist, watchlist_type", [
+    ("John Smith", "John Smith", ""),
+    ("John Smith", "John Smith", "Vessel"),
+    ("Apple", "Apple", "Entity"),
+    ("Владимир Путин", "Vladimir Putin", "Person"),
+    ("Michael Johnson", "Michael Jordan", "Person"),
+])
+def test_prefilter_leaves_undecided_cases_to_the_model(transaction, watchlist, watchlist_type):
+    assert llm_api.prefilter(transaction, watchlist, watchlist_type) is None
+
+
+def test_local_verdicts_carry_every_required_field():
+    result = llm_api.prefilter("Tom Brown", "Alice Green", "Person")
+    assert llm_api.is_complete(result)
+
+
+def verdict(case=None, outcome="True Match", confidence="High"):
+    result = {
+        "MatchOutcome": outcome,
+        "Confidence": confidence,
+        "Reason": {"TypeValidation": "Pass"},
+        "RecommendedAction": "Block & Review" if outcome == "True Match" else "Allow & Log",
+    }
+    if case is not None:
+        result["Case"] = case
+    return result
+
+
+class StubClient:
+    """Stands in for AsyncGroq; respond(model, user_message) returns the message content or raises"""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        self.calls.append(model)
+        content = self.respond(model, messages[-1]["content"])
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def batch_response(*results):
+    return json.dumps({"results": list(results)})
+
+
+@pytest.fixture(autouse=True)
+def unlimited_rate(monkeypatch):
+    limiter = AsyncLimiter(max_rate=1000, time_period=1)
+    monkeypatch.setattr(llm_api, "rate_limiters", {llm_api.DRAFT_MODEL: limiter, llm_api.VERIFY_MODEL: limiter})
+
+
+CASES = [("Michael Johnson", "Michael Jordan", "Person"), ("Jon Smyth", "John Smith", "Person")]
+
+
+def run_batch(respond, cases=CASES):
+    return asyncio.run(llm_api.process_batch(StubClient(respond), cases, llm_api.DRAFT_MODEL))
+
+
+def test_process_batch_returns_results_in_case_order():
+    results = run_batch(lambda model, message: batch_response(verdict(1), verdict(2, "False Match")))
+    assert [result["MatchOutcome"] for result in results] == ["True Match", "False Match"]
+
+
+def test_process_batch_accepts_case_numbers_sent_as_strings():
+    assert run_batch(lambda model, message: batch_response(verdict("1"), verdict("2"))) is not None
+
+
+@pytest.mark.parametrize("content", [
+    batch_response(verdict(1)),
+    batch_response(verdict(2), verdict(1)),
+    batch_response(verdict(1), verdict(1)),
+    batch_response(verdict(1), "not a verdict"),
+    json.dumps([verdict(1), verdict(2)]),
+    "{not json",
+])
+def test_process_batch_rejects_unusable_responses(content):
+    assert run_batch(lambda model, message: content) is None
+
+
+def test_process_batch_does_not_require_a_case_number_for_a_single_case():
+    results = run_batch(lambda model, message: batch_response(verdict()), cases=CASES[:1])
+    assert results == [verdict()]
+
+
+def test_process_batch_returns_none_when_the_api_fails():
+    def respond(model, message):
+        request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+        raise groq.BadRequestError("bad request", response=httpx.Response(400, request=request), body=None)
+
+    assert run_batch(respond) is None
+
+
+def test_build_user_message_numbers_each_case():
+    message = llm_api.build_user_message(CASES)
+    assert "Case 1:\nTransaction Data: Michael Johnson" in message
+    assert "Case 2:\nTransaction Data: Jon Smyth" in message
+    assert message.endswith(llm_api.BATCH_INSTRUCTION)
+
+
+def test_cache_round_trips_complete_verdicts_and_skips_bad_lines(tmp_path):
+    cache_file = tmp_path / "cache.jsonl"
+    llm_api.save_cache(str(cache_file), {"complete": verdict()})
+    with open(cache_file, "ab") as cache_out:
+        cache_out.write(b"{not json\n")
+        cache_out.write(b'{"key": "partial", "result": {"MatchOutcome": "True Match"}}\n')
+        cache_out.write(b'["not", "an", "entry"]\n')
+
+    assert llm_api.load_cache(str(cache_file)) == {"complete": verdict()}
+
+
+def test_load_cache_without_a_file_is_empty(tmp_path):
+    assert llm_api.load_cache(str(tmp_path / "missing.jsonl")) == {}
+
+
+def test_cache_key_depends_on_case_and_models(monkeypatch):
+    key = llm_api.cache_key(*CASES[0])
+    assert key == llm_api.cache_key(*CASES[0])
+    assert key != llm_api.cache_key(*CASES[1])
+    monkeypatch.setattr(llm_api, "VERIFY_MODEL", "another-model")
+    assert key != llm_api.cache_key(*CASES[0])
+
+
+def retry_state(error, attempt_number=1):
+    return SimpleNamespace(outcome=SimpleNamespace(exception=lambda: error), attempt_number=attempt_number)
+
+
+def rate_limit_error(headers):
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(429, headers=headers, request=request)
+    return groq.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_wait_for_retry_honours_retry_after():
+    assert llm_api.wait_for_retry(retry_state(rate_limit_error({"retry-after": "7"}))) == 7.0
+
+
+@pytest.mark.parametrize("error", [
+    rate_limit_error({}),
+    rate_limit_error({"retry-after": "soon"}),
+    groq.APIConnectionError(request=httpx.Request("POST", "https://api.groq.com")),
+])
+def test_wait_for_retry_falls_back_to_jittered_backoff(error):
+    delay = llm_api.wait_for_retry(retry_state(error))
+    assert 0 < delay <= 2
+
+
+def run_cases(monkeypatch, tmp_path, respond, cases=CASES):
+    """Run run_test_cases against a stub client and return its results and the client"""
+    clients = []
+
+    def make_client(**kwargs):
+        clients.append(StubClient(respond))
+        return clients[-1]
+
+    monkeypatch.setattr(llm_api, "AsyncGroq", make_client)
+    monkeypatch.setattr(llm_api, "CACHE_FILE", str(tmp_path / "cache.jsonl"))
+    return asyncio.run(llm_api.run_test_cases(cases)), clients[0]
+
+
+def test_run_test_cases_caches_confident_drafts(monkeypatch, tmp_path):
+    respond = lambda model, message: batch_response(verdict(1), verdict(2, "False Match"))
+    results, client = run_cases(monkeypatch, tmp_path, respond)
+    assert client.calls == [llm_api.DRAFT_MODEL]
+    assert [result["MatchOutcome"] for result in results] == ["True Match", "False Match"]
+
+    results, client = run_cases(monkeypatch, tmp_path, lambda model, message: pytest.fail("cache missed"))
+    assert client.calls == []
+    assert [result["MatchOutcome"] for result in results] == ["True Match", "False Match"]
+
+
+def test_run_test_cases_does_not_cache_unverified_drafts(monkeypatch, tmp_path):
+    def respond(model, message):
+        if model == llm_api.VERIFY_MODEL:
+            return "{not json"
+        return batch_response(verdict(1, confidence="Medium"), verdict(2, confidence="Medium"))
+
+    results, client = run_cases(monkeypatch, tmp_path, respond)
+    assert [result["Confidence"] for result in results] == ["Medium", "Medium"]
+    assert llm_api.VERIFY_MODEL in client.calls
+    assert llm_api.load_cache(llm_api.CACHE_FILE) == {}
+
+
+def test_run_test_cases_returns_incomplete_verdicts_without_caching_them(monkeypatch, tmp_path):
+    incomplete = {"MatchOutcome": "True Match", "Confidence": "High"}
+    respond = lambda model, message: batch_response(incomplete)
+    results, _ = run_cases(monkeypatch, tmp_path, respond, cases=CASES[:1])
+    assert results == [incomplete]
+    assert llm_api.load_cache(llm_api.CACHE_FILE) == {}
+
+
+def test_run_test_cases_falls_back_to_single_cases(monkeypatch, tmp_path):
+    def respond(model, message):
+        if "Case 2:" in message:
+            return batch_response(verdict(2), verdict(1))
+        return batch_response(verdict())
+
+    results, client = run_cases(monkeypatch, tmp_path, respond)
+    assert [result["MatchOutcome"] for result in results] == ["True Match", "True Match"]
+    assert client.calls == [llm_api.DRAFT_MODEL] * 3